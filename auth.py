@@ -2,6 +2,9 @@ from datetime import datetime, timedelta
 from typing import Optional
 import jwt
 import hashlib
+import threading
+import time
+from cachetools import TTLCache
 from database import get_user_by_username
 
 # Secret key for JWT (in production, use environment variable)
@@ -9,6 +12,10 @@ SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Payloads of recently verified tokens, keyed by the raw token string
+_verified_tokens = TTLCache(maxsize=4096, ttl=60)
+_verified_tokens_lock = threading.Lock()
+
 def hash_password(password: str) -> str:
     """Hash a password using SHA256"""
     return hashlib.sha256(password.encode()).hexdigest()
@@ -30,14 +37,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 def verify_token(token: str) -> Optional[dict]:
-    """Verify and decode a JWT token"""
+    """Verify and decode a JWT token (recently verified tokens are cached)"""
+    with _verified_tokens_lock:
+        payload = _verified_tokens.get(token)
+    if payload is not None:
+        exp = payload.get("exp")
+        if exp is None or exp > time.time():
+            return payload
+        # Expired while cached
+        with _verified_tokens_lock:
+            _verified_tokens.pop(token, None)
+        return None
+    
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
+    
+    with _verified_tokens_lock:
+        _verified_tokens[token] = payload
+    return payload
 
 def authenticate_user(username: str, password: str) -> Optional[dict]:
     """Authenticate a user and return user info if valid"""
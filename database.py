@@ -1,107 +1,292 @@
+import atexit
+import itertools
+import queue
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from contextlib import contextmanager
 from typing import Optional
 
+from cachetools import TTLCache
+
 # Database file name
 DB_FILE = "sweet_shop.db"
 
-def get_db_connection():
-    """Create and return a database connection"""
-    conn = sqlite3.connect(DB_FILE)
+# Number of connections kept open in the pool
+POOL_SIZE = 8
+
+# Per-connection tuning applied to every pooled connection
+_CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA foreign_keys=ON",
+)
+
+_pool: Optional[queue.Queue] = None
+_pool_lock = threading.Lock()
+
+def _create_connection() -> sqlite3.Connection:
+    """Open a connection configured for pooled, autocommit use"""
+    conn = sqlite3.connect(DB_FILE, check_same_thread=False, isolation_level=None)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    for pragma in _CONNECTION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
+def _get_pool() -> queue.Queue:
+    """Return the connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = queue.Queue(maxsize=POOL_SIZE)
+                for _ in range(POOL_SIZE):
+                    pool.put(_create_connection())
+                _pool = pool
+    return _pool
+
+@contextmanager
+def pooled_connection():
+    """Borrow a connection from the pool for the duration of a with-block"""
+    pool = _get_pool()
+    conn = pool.get()
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        pool.put(conn)
+
+def close_pool():
+    """Close every pooled connection"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is None:
+        return
+    while True:
+        try:
+            pool.get_nowait().close()
+        except queue.Empty:
+            break
+
+atexit.register(close_pool)
+
+# Recently looked-up users, keyed by username
+_user_cache = TTLCache(maxsize=1024, ttl=300)
+_user_cache_lock = threading.Lock()
+
+# Columns returned by the RETURNING clause of sweet mutations. RETURNING can
+# report whole-number prices as integers, so cast back to REAL explicitly.
+_SWEET_COLUMNS = "id, name, category, CAST(price AS REAL) AS price, quantity, created_at"
+
+# Once any user exists it stays that way, so the answer is remembered
+_any_user_exists = False
+
+# Seconds the cached catalog is trusted; writes from other processes (e.g. a
+# second CLI) only become visible once it expires
+SWEETS_CACHE_TTL = 5
+
+# Full catalog as returned by get_all_sweets; the version is bumped on every write
+_sweets_cache: Optional[list] = None
+_sweets_cached_at = 0.0
+_sweets_version = 0
+_sweets_cache_lock = threading.Lock()
+
+def _expire_sweets_cache():
+    """Drop the cached catalog once it is older than SWEETS_CACHE_TTL"""
+    global _sweets_cache, _sweets_version
+    with _sweets_cache_lock:
+        if _sweets_cache is not None and time.monotonic() - _sweets_cached_at >= SWEETS_CACHE_TTL:
+            _sweets_cache = None
+            _sweets_version += 1
+
+def _invalidate_sweets_cache():
+    """Drop the cached catalog after a write to the sweets table"""
+    global _sweets_cache, _sweets_version
+    with _sweets_cache_lock:
+        _sweets_cache = None
+        _sweets_version += 1
+
+def get_sweets_version() -> int:
+    """Return a counter that changes whenever the sweets table is written or the cache expires"""
+    _expire_sweets_cache()
+    return _sweets_version
+
+# Column definitions for each table. created_at is filled in by SQLite.
+_TABLE_COLUMNS = {
+    "users": """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        is_admin INTEGER DEFAULT 0,
+        created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'))
+    """,
+    "sweets": """
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        category TEXT NOT NULL,
+        price REAL NOT NULL,
+        quantity INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now', 'localtime'))
+    """,
+}
+
+def _add_created_at_default(cursor: sqlite3.Cursor, table: str):
+    """Rebuild a table created before created_at had a default"""
+    columns = cursor.execute(f"PRAGMA table_info({table})").fetchall()
+    created_at = next(col for col in columns if col["name"] == "created_at")
+    if created_at["dflt_value"] is not None:
+        return
+    
+    # SQLite cannot change a column default in place, so copy into a new table
+    names = ", ".join(col["name"] for col in columns)
+    cursor.execute("BEGIN IMMEDIATE")
+    seq = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+    cursor.execute(f"CREATE TABLE {table}_new ({_TABLE_COLUMNS[table]})")
+    cursor.execute(f"INSERT INTO {table}_new ({names}) SELECT {names} FROM {table}")
+    cursor.execute(f"DROP TABLE {table}")
+    cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+    if seq:
+        # Keep AUTOINCREMENT from reusing IDs of rows deleted before the rebuild
+        cursor.execute("UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?", (seq[0], table))
+    cursor.execute("COMMIT")
+
 def init_database():
     """Initialize the database with required tables"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Users table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            is_admin INTEGER DEFAULT 0,
-            created_at TEXT NOT NULL
-        )
-    """)
-    
-    # Sweets table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS sweets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            category TEXT NOT NULL,
-            price REAL NOT NULL,
-            quantity INTEGER NOT NULL DEFAULT 0,
-            created_at TEXT NOT NULL
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
+    with pooled_connection() as conn:
+        # WAL mode and the per-connection PRAGMAs are set by _create_connection
+        cursor = conn.cursor()
+        
+        # Users and sweets tables
+        for table, columns in _TABLE_COLUMNS.items():
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+            _add_created_at_default(cursor, table)
+        
+        # Indexes backing the search filters
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sweets_category ON sweets(category)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sweets_price ON sweets(price)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sweets_name ON sweets(name COLLATE NOCASE)")
     print("Database initialized successfully!")
 
 def get_user_by_username(username: str) -> Optional[dict]:
-    """Get user by username"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-    row = cursor.fetchone()
-    conn.close()
-    return dict(row) if row else None
+    """Get user by username (cached for a few minutes)"""
+    with _user_cache_lock:
+        user = _user_cache.get(username)
+    if user is not None:
+        return user
+    
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
+        row = cursor.fetchone()
+    if not row:
+        return None
+    
+    user = dict(row)
+    with _user_cache_lock:
+        _user_cache[username] = user
+    return user
+
+def user_exists_any() -> bool:
+    """Check whether at least one user has registered"""
+    global _any_user_exists
+    if _any_user_exists:
+        return True
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM users LIMIT 1")
+        exists = cursor.fetchone() is not None
+    if exists:
+        _any_user_exists = True
+    return exists
 
 def create_user(username: str, password_hash: str, is_admin: bool = False) -> int:
     """Create a new user"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO users (username, password_hash, is_admin, created_at)
-        VALUES (?, ?, ?, ?)
-    """, (username, password_hash, 1 if is_admin else 0, datetime.now().isoformat()))
-    user_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO users (username, password_hash, is_admin)
+            VALUES (?, ?, ?)
+        """, (username, password_hash, 1 if is_admin else 0))
+        user_id = cursor.lastrowid
+    with _user_cache_lock:
+        _user_cache.pop(username, None)
     return user_id
 
 def get_sweet_by_id(sweet_id: int) -> Optional[dict]:
     """Get sweet by ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM sweets WHERE id = ?", (sweet_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM sweets WHERE id = ?", (sweet_id,))
+        row = cursor.fetchone()
     return dict(row) if row else None
 
 def get_all_sweets() -> list:
-    """Get all sweets"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM sweets ORDER BY id")
-    rows = cursor.fetchall()
-    conn.close()
-    return [dict(row) for row in rows]
+    """Get all sweets as read-only sqlite3.Row objects (cached briefly, dropped on writes)"""
+    global _sweets_cache, _sweets_cached_at
+    _expire_sweets_cache()
+    with _sweets_cache_lock:
+        if _sweets_cache is not None:
+            return _sweets_cache
+        version = _sweets_version
+    
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM sweets ORDER BY id")
+        sweets = cursor.fetchall()
+    
+    with _sweets_cache_lock:
+        # Only keep the result if no write happened while we were reading
+        if _sweets_version == version:
+            _sweets_cache = sweets
+            _sweets_cached_at = time.monotonic()
+    return sweets
 
-def create_sweet(name: str, category: str, price: float, quantity: int) -> int:
-    """Create a new sweet"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO sweets (name, category, price, quantity, created_at)
-        VALUES (?, ?, ?, ?, ?)
-    """, (name, category, price, quantity, datetime.now().isoformat()))
-    sweet_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return sweet_id
+def create_sweet(name: str, category: str, price: float, quantity: int) -> dict:
+    """Create a new sweet and return it"""
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            INSERT INTO sweets (name, category, price, quantity)
+            VALUES (?, ?, ?, ?)
+            RETURNING {_SWEET_COLUMNS}
+        """, (name, category, price, quantity))
+        row = cursor.fetchall()[0]
+    _invalidate_sweets_cache()
+    return dict(row)
+
+def create_sweets_bulk(rows: list) -> list:
+    """Create many sweets in one transaction
+    
+    Each row is a (name, category, price, quantity) tuple. Returns the new IDs
+    in insertion order.
+    """
+    if not rows:
+        return []
+    params = list(rows)
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.executemany("""
+            INSERT INTO sweets (name, category, price, quantity)
+            VALUES (?, ?, ?, ?)
+        """, params)
+        # The write lock is held, so the new IDs are contiguous
+        last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+        cursor.execute("COMMIT")
+    _invalidate_sweets_cache()
+    return list(range(last_id - len(params) + 1, last_id + 1))
 
 def update_sweet(sweet_id: int, name: str = None, category: str = None, 
-                 price: float = None, quantity: int = None) -> bool:
-    """Update a sweet's details"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+                 price: float = None, quantity: int = None) -> Optional[dict]:
+    """Update a sweet's details and return the updated sweet
     
+    Returns None if the sweet does not exist or no fields were given.
+    """
     updates = []
     values = []
     
@@ -119,89 +304,105 @@ def update_sweet(sweet_id: int, name: str = None, category: str = None,
         values.append(quantity)
     
     if not updates:
-        conn.close()
-        return False
+        return None
     
     values.append(sweet_id)
-    query = f"UPDATE sweets SET {', '.join(updates)} WHERE id = ?"
-    cursor.execute(query, values)
-    conn.commit()
-    conn.close()
-    return cursor.rowcount > 0
+    query = f"UPDATE sweets SET {', '.join(updates)} WHERE id = ? RETURNING {_SWEET_COLUMNS}"
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, values)
+        rows = cursor.fetchall()
+    if not rows:
+        return None
+    _invalidate_sweets_cache()
+    return dict(rows[0])
 
 def delete_sweet(sweet_id: int) -> bool:
     """Delete a sweet"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM sweets WHERE id = ?", (sweet_id,))
-    conn.commit()
-    deleted = cursor.rowcount > 0
-    conn.close()
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM sweets WHERE id = ? RETURNING id", (sweet_id,))
+        deleted = bool(cursor.fetchall())
+    if deleted:
+        _invalidate_sweets_cache()
     return deleted
 
-def search_sweets(name: str = None, category: str = None, 
-                  min_price: float = None, max_price: float = None) -> list:
-    """Search sweets by name, category, or price range"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+def _build_search_sql(name: bool, category: bool, min_price: bool, max_price: bool) -> str:
+    """Build the search query for one combination of active filters"""
     query = "SELECT * FROM sweets WHERE 1=1"
-    params = []
-    
     if name:
         query += " AND name LIKE ?"
-        params.append(f"%{name}%")
     if category:
         query += " AND category = ?"
+    if min_price:
+        query += " AND price >= ?"
+    if max_price:
+        query += " AND price <= ?"
+    return query + " ORDER BY id"
+
+# One fixed query string per filter combination, so sqlite3's statement cache can reuse them
+_SEARCH_SQL = {
+    key: _build_search_sql(*key)
+    for key in itertools.product((False, True), repeat=4)
+}
+
+def search_sweets(name: str = None, category: str = None, 
+                  min_price: float = None, max_price: float = None,
+                  prefix: bool = False) -> list:
+    """Search sweets by name, category, or price range
+    
+    With prefix=True the name only matches at the start, which lets SQLite
+    use the name index instead of scanning the table.
+    """
+    key = (bool(name), bool(category), min_price is not None, max_price is not None)
+    params = []
+    if name:
+        params.append(f"{name}%" if prefix else f"%{name}%")
+    if category:
         params.append(category)
     if min_price is not None:
-        query += " AND price >= ?"
         params.append(min_price)
     if max_price is not None:
-        query += " AND price <= ?"
         params.append(max_price)
     
-    query += " ORDER BY id"
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
-    conn.close()
+    query = _SEARCH_SQL[key]
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
     return [dict(row) for row in rows]
 
-def purchase_sweet(sweet_id: int, quantity: int) -> bool:
-    """Purchase a sweet (decrease quantity)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT quantity FROM sweets WHERE id = ?", (sweet_id,))
-    row = cursor.fetchone()
-    if not row:
-        conn.close()
-        return False
-    
-    current_quantity = row[0]
-    if current_quantity < quantity:
-        conn.close()
-        return False
-    
-    new_quantity = current_quantity - quantity
-    cursor.execute("UPDATE sweets SET quantity = ? WHERE id = ?", (new_quantity, sweet_id))
-    conn.commit()
-    conn.close()
-    return True
-
-def restock_sweet(sweet_id: int, quantity: int) -> bool:
-    """Restock a sweet (increase quantity)"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT quantity FROM sweets WHERE id = ?", (sweet_id,))
-    row = cursor.fetchone()
-    if not row:
-        conn.close()
-        return False
+def purchase_sweet(sweet_id: int, quantity: int) -> Optional[dict]:
+    """Purchase a sweet (decrease quantity) and return the updated sweet
     
-    current_quantity = row[0]
-    new_quantity = current_quantity + quantity
-    cursor.execute("UPDATE sweets SET quantity = ? WHERE id = ?", (new_quantity, sweet_id))
-    conn.commit()
-    conn.close()
-    return True
+    Returns None if the sweet does not exist or has too little stock.
+    """
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        # Stock check and decrement in one statement so concurrent purchases cannot oversell
+        cursor.execute(
+            f"UPDATE sweets SET quantity = quantity - ? WHERE id = ? AND quantity >= ? RETURNING {_SWEET_COLUMNS}",
+            (quantity, sweet_id, quantity)
+        )
+        rows = cursor.fetchall()
+    if not rows:
+        return None
+    _invalidate_sweets_cache()
+    return dict(rows[0])
 
+def restock_sweet(sweet_id: int, quantity: int) -> Optional[dict]:
+    """Restock a sweet (increase quantity) and return the updated sweet
+    
+    Returns None if the sweet does not exist.
+    """
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE sweets SET quantity = quantity + ? WHERE id = ? RETURNING {_SWEET_COLUMNS}",
+            (quantity, sweet_id)
+        )
+        rows = cursor.fetchall()
+    if not rows:
+        return None
+    _invalidate_sweets_cache()
+    return dict(rows[0])
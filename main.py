@@ -1,13 +1,19 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from anyio import to_thread
+from contextlib import asynccontextmanager
 from typing import Optional
+import csv
+import json
 import sys
 
 from database import (
     init_database, create_user, get_user_by_username, get_all_sweets,
-    create_sweet, update_sweet, delete_sweet, search_sweets,
-    purchase_sweet, restock_sweet, get_sweet_by_id
+    create_sweet, create_sweets_bulk, update_sweet, delete_sweet, search_sweets,
+    purchase_sweet, restock_sweet, get_sweet_by_id, get_sweets_version,
+    user_exists_any
 )
 from models import (
     UserRegister, UserLogin, TokenResponse, SweetCreate, SweetUpdate,
@@ -17,31 +23,43 @@ from auth import (
     hash_password, create_access_token, verify_token, authenticate_user
 )
 
+# Worker threads for sync endpoints. Many requests are answered from the user,
+# token and catalog caches, so this can safely exceed the SQLite pool size.
+THREADPOOL_SIZE = 200
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Size the threadpool that runs the sync endpoints"""
+    to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    yield
+
 # Initialize FastAPI app
-app = FastAPI(title="Sweet Shop Management API", version="1.0.0")
+app = FastAPI(title="Sweet Shop Management API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware for Streamlit
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=["http://localhost:8501", "http://127.0.0.1:8501"],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "PUT", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
 )
 
 # Security scheme
 security = HTTPBearer()
 
-# Dependency to get current user from token
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    """Get current authenticated user from JWT token"""
-    token = credentials.credentials
+# Encoded body of GET /api/sweets, tagged with the catalog version it was built from
+_sweets_body: tuple = (None, b"")
+
+def _user_from_token(token: str) -> dict:
+    """Resolve a JWT into the current user or raise 401"""
     payload = verify_token(token)
     if payload is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token"
         )
+    # Served from the user cache for most requests, so this rarely touches SQLite
     username = payload.get("sub")
     user = get_user_by_username(username)
     if user is None:
@@ -55,6 +73,25 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
         "is_admin": bool(user["is_admin"])
     }
 
+# Dependency to get current user from token
+def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """Get current authenticated user from JWT token"""
+    return _user_from_token(credentials.credentials)
+
+# Lighter dependency for the read-only catalog routes
+def get_reader(request: Request) -> dict:
+    """Get current user straight from the Authorization header, skipping HTTPBearer"""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authenticated"
+        )
+    return _user_from_token(token)
+
+# Keeps the bearer lock on routes that use get_reader in the API docs
+BEARER_DOCS = {"security": [{"HTTPBearer": []}]}
+
 # Dependency to check if user is admin
 def get_admin_user(current_user: dict = Depends(get_current_user)) -> dict:
     """Check if current user is admin"""
@@ -115,14 +152,10 @@ def register(user_data: UserRegister):
     
     # Determine admin status
     ADMIN_KEY = "aswd"
-    conn = __import__('sqlite3').connect("sweet_shop.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM users")
-    user_count = cursor.fetchone()[0]
-    conn.close()
+    is_first_user = not user_exists_any()
     
     # First user is admin OR user provided correct admin key
-    is_admin = (user_count == 0) or (user_data.admin_key == ADMIN_KEY)
+    is_admin = is_first_user or (user_data.admin_key == ADMIN_KEY)
     
     password_hash = hash_password(user_data.password)
     user_id = create_user(user_data.username, password_hash, is_admin)
@@ -151,27 +184,38 @@ def login(user_data: UserLogin):
 @app.post("/api/sweets", response_model=SweetResponse, status_code=status.HTTP_201_CREATED)
 def add_sweet(sweet: SweetCreate, current_user: dict = Depends(get_current_user)):
     """Add a new sweet (Protected)"""
-    sweet_id = create_sweet(sweet.name, sweet.category, sweet.price, sweet.quantity)
-    created_sweet = get_sweet_by_id(sweet_id)
-    return SweetResponse(**created_sweet)
+    created_sweet = create_sweet(sweet.name, sweet.category, sweet.price, sweet.quantity)
+    # The row comes straight from our own table, so skip response model validation
+    return JSONResponse(content=created_sweet, status_code=status.HTTP_201_CREATED)
 
-@app.get("/api/sweets", response_model=list[SweetResponse])
-def get_sweets(current_user: dict = Depends(get_current_user)):
+@app.get("/api/sweets", response_model=list[SweetResponse], openapi_extra=BEARER_DOCS)
+def get_sweets(current_user: dict = Depends(get_reader)):
     """Get all sweets (Protected)"""
-    sweets = get_all_sweets()
-    return [SweetResponse(**sweet) for sweet in sweets]
+    global _sweets_body
+    version, body = _sweets_body
+    current_version = get_sweets_version()
+    if version != current_version:
+        # Rows are only turned into dicts here, once per catalog version
+        body = json.dumps(
+            [dict(row) for row in get_all_sweets()],
+            ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+        _sweets_body = (current_version, body)
+    return Response(content=body, media_type="application/json")
 
-@app.get("/api/sweets/search", response_model=list[SweetResponse])
+@app.get("/api/sweets/search", response_model=list[SweetResponse], openapi_extra=BEARER_DOCS)
 def search_sweets_endpoint(
     name: Optional[str] = None,
     category: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
-    current_user: dict = Depends(get_current_user)
+    prefix: bool = False,
+    current_user: dict = Depends(get_reader)
 ):
     """Search sweets by name, category, or price range (Protected)"""
-    results = search_sweets(name, category, min_price, max_price)
-    return [SweetResponse(**sweet) for sweet in results]
+    # Rows come straight from our own table, so skip response model validation
+    results = search_sweets(name, category, min_price, max_price, prefix)
+    return JSONResponse(content=results)
 
 @app.put("/api/sweets/{sweet_id}", response_model=SweetResponse)
 def update_sweet_endpoint(
@@ -180,31 +224,31 @@ def update_sweet_endpoint(
     current_user: dict = Depends(get_current_user)
 ):
     """Update a sweet's details (Protected)"""
-    if not get_sweet_by_id(sweet_id):
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Sweet not found"
-        )
-    
-    update_sweet(
+    updated_sweet = update_sweet(
         sweet_id,
         name=sweet_update.name,
         category=sweet_update.category,
         price=sweet_update.price,
         quantity=sweet_update.quantity
     )
-    updated_sweet = get_sweet_by_id(sweet_id)
-    return SweetResponse(**updated_sweet)
+    if updated_sweet is None:
+        # Nothing was updated: either the sweet is missing or the body was empty
+        updated_sweet = get_sweet_by_id(sweet_id)
+        if not updated_sweet:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Sweet not found"
+            )
+    return JSONResponse(content=updated_sweet)
 
 @app.delete("/api/sweets/{sweet_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_sweet_endpoint(sweet_id: int, current_user: dict = Depends(get_admin_user)):
     """Delete a sweet (Admin only)"""
-    if not get_sweet_by_id(sweet_id):
+    if not delete_sweet(sweet_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Sweet not found"
         )
-    delete_sweet(sweet_id)
     return None
 
 # ============ INVENTORY ENDPOINTS ============
@@ -216,21 +260,19 @@ def purchase_sweet_endpoint(
     current_user: dict = Depends(get_current_user)
 ):
     """Purchase a sweet, decreasing its quantity (Protected)"""
-    sweet = get_sweet_by_id(sweet_id)
-    if not sweet:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Sweet not found"
-        )
-    
-    if not purchase_sweet(sweet_id, purchase.quantity):
+    updated_sweet = purchase_sweet(sweet_id, purchase.quantity)
+    if updated_sweet is None:
+        # Only look the sweet up again to tell "missing" apart from "out of stock"
+        if not get_sweet_by_id(sweet_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Sweet not found"
+            )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Insufficient quantity in stock"
         )
-    
-    updated_sweet = get_sweet_by_id(sweet_id)
-    return SweetResponse(**updated_sweet)
+    return JSONResponse(content=updated_sweet)
 
 @app.post("/api/sweets/{sweet_id}/restock", response_model=SweetResponse)
 def restock_sweet_endpoint(
@@ -239,31 +281,35 @@ def restock_sweet_endpoint(
     current_user: dict = Depends(get_admin_user)
 ):
     """Restock a sweet, increasing its quantity (Admin only)"""
-    sweet = get_sweet_by_id(sweet_id)
-    if not sweet:
+    updated_sweet = restock_sweet(sweet_id, restock.quantity)
+    if updated_sweet is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Sweet not found"
         )
-    
-    restock_sweet(sweet_id, restock.quantity)
-    updated_sweet = get_sweet_by_id(sweet_id)
-    return SweetResponse(**updated_sweet)
+    return JSONResponse(content=updated_sweet)
 
 # ============ CLI INTERFACE ============
 
+# Sweets table layout
+_SEP = "="*80
+_HDR = f"{'ID':<5} {'Name':<25} {'Category':<15} {'Price':<10} {'Quantity':<10}"
+_ROW_FMT = "{:<5} {:<25} {:<15} ${:<9.2f} {:<10}".format
+
 def display_sweets(sweets_list):
     """Display sweets in a formatted table"""
     if not sweets_list:
         print("\nNo sweets found.")
         return
     
-    print("\n" + "="*80)
-    print(f"{'ID':<5} {'Name':<25} {'Category':<15} {'Price':<10} {'Quantity':<10}")
-    print("="*80)
-    for sweet in sweets_list:
-        print(f"{sweet['id']:<5} {sweet['name']:<25} {sweet['category']:<15} ${sweet['price']:<9.2f} {sweet['quantity']:<10}")
-    print("="*80)
+    # Build the whole table first and write it in one go
+    lines = ["", _SEP, _HDR, _SEP]
+    lines.extend(
+        _ROW_FMT(sweet["id"], sweet["name"], sweet["category"], sweet["price"], sweet["quantity"])
+        for sweet in sweets_list
+    )
+    lines.append(_SEP)
+    sys.stdout.write("\n".join(lines) + "\n")
 
 def sweet_management_menu(current_user):
     """Main menu for sweet management after login"""
@@ -283,10 +329,11 @@ def sweet_management_menu(current_user):
         print("5. Delete Sweet" + (" (Admin)" if is_admin else " (Admin Only)"))
         print("6. Purchase Sweet")
         print("7. Restock Sweet" + (" (Admin)" if is_admin else " (Admin Only)"))
-        print("8. Logout")
-        print("9. Exit Application")
+        print("8. Import Sweets from CSV" + (" (Admin)" if is_admin else " (Admin Only)"))
+        print("9. Logout")
+        print("10. Exit Application")
         
-        choice = input("\nEnter your choice (1-9): ").strip()
+        choice = input("\nEnter your choice (1-10): ").strip()
         
         if choice == "1":
             # View all sweets
@@ -311,8 +358,8 @@ def sweet_management_menu(current_user):
                     print("Error: Price and quantity must be non-negative!")
                     continue
                 
-                sweet_id = create_sweet(name, category, price, quantity)
-                print(f"\n✓ Sweet '{name}' added successfully! (ID: {sweet_id})")
+                sweet = create_sweet(name, category, price, quantity)
+                print(f"\n✓ Sweet '{name}' added successfully! (ID: {sweet['id']})")
             except ValueError:
                 print("Error: Invalid input! Price must be a number and quantity must be an integer.")
         
@@ -433,8 +480,8 @@ def sweet_management_menu(current_user):
                     print(f"Error: Sweet with ID {sweet_id} not found!")
                     continue
                 
-                if purchase_sweet(sweet_id, quantity):
-                    updated = get_sweet_by_id(sweet_id)
+                updated = purchase_sweet(sweet_id, quantity)
+                if updated:
                     print(f"\n✓ Purchased {quantity} unit(s) of '{sweet['name']}'!")
                     print(f"  Remaining stock: {updated['quantity']}")
                 else:
@@ -462,8 +509,8 @@ def sweet_management_menu(current_user):
                     print(f"Error: Sweet with ID {sweet_id} not found!")
                     continue
                 
-                if restock_sweet(sweet_id, quantity):
-                    updated = get_sweet_by_id(sweet_id)
+                updated = restock_sweet(sweet_id, quantity)
+                if updated:
                     print(f"\n✓ Restocked {quantity} unit(s) of '{sweet['name']}'!")
                     print(f"  New stock: {updated['quantity']}")
                 else:
@@ -472,11 +519,44 @@ def sweet_management_menu(current_user):
                 print("Error: Invalid input! ID and quantity must be integers.")
         
         elif choice == "8":
+            # Import sweets from a CSV file (Admin only)
+            if not is_admin:
+                print("\n✗ Error: Admin privileges required to import sweets!")
+                continue
+            
+            print("\n--- Import Sweets from CSV ---")
+            print("The file needs a header row with: name, category, price, quantity")
+            path = input("Enter CSV file path: ").strip()
+            try:
+                with open(path, newline="", encoding="utf-8") as f:
+                    rows = [
+                        (row["name"].strip(), row["category"].strip(), float(row["price"]), int(row["quantity"]))
+                        for row in csv.DictReader(f)
+                    ]
+            except OSError as e:
+                print(f"Error: Cannot read file: {e}")
+                continue
+            except (KeyError, ValueError, TypeError, AttributeError):
+                print("Error: Every row needs a name, category, numeric price and integer quantity!")
+                continue
+            
+            if not rows:
+                print("Error: The file contains no sweets!")
+                continue
+            if any(not name or not category or price < 0 or quantity < 0 for name, category, price, quantity in rows):
+                print("Error: Name and category are required, and price and quantity must be non-negative!")
+                continue
+            
+            # One transaction for the whole file
+            ids = create_sweets_bulk(rows)
+            print(f"\n✓ Imported {len(ids)} sweet(s)! (IDs {ids[0]}-{ids[-1]})")
+        
+        elif choice == "9":
             # Logout
             print("\n✓ Logged out successfully!")
             return None
         
-        elif choice == "9":
+        elif choice == "10":
             # Exit application
             print("\nGoodbye!")
             sys.exit(0)
@@ -513,21 +593,17 @@ def cli_interface():
             
             # Determine admin status
             ADMIN_KEY = "aswd"
-            conn = __import__('sqlite3').connect("sweet_shop.db")
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM users")
-            user_count = cursor.fetchone()[0]
-            conn.close()
+            is_first_user = not user_exists_any()
             
             # First user is admin OR user provided correct admin key
-            is_admin = (user_count == 0) or (admin_key == ADMIN_KEY)
+            is_admin = is_first_user or (admin_key == ADMIN_KEY)
             
             password_hash = hash_password(password)
             user_id = create_user(username, password_hash, is_admin)
             
             print(f"\n✓ User '{username}' registered successfully!")
             if is_admin:
-                if user_count == 0:
+                if is_first_user:
                     print("✓ You are the first user - you have admin privileges!")
                 else:
                     print("✓ Admin key verified - you have admin privileges!")
@@ -566,7 +642,10 @@ if __name__ == "__main__":
     
     def run_server():
         """Run the FastAPI server"""
-        uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
+        # One in-process server: the CLI shares this process and its caches.
+        # uvloop/httptools are picked automatically when uvicorn[standard] is installed.
+        uvicorn.run(app, host="0.0.0.0", port=8000, loop="auto", http="auto",
+                    log_level="warning", access_log=False)
     
     # Start server in background thread
     server_thread = threading.Thread(target=run_server, daemon=True)
@@ -1,34 +1,46 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 
 # User models
 class UserRegister(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     username: str
     password: str
     admin_key: Optional[str] = None
 
 class UserLogin(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     username: str
     password: str
 
 class TokenResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     access_token: str
     token_type: str = "bearer"
 
 # Sweet models
 class SweetCreate(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     name: str
     category: str
     price: float
     quantity: int
 
 class SweetUpdate(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     name: Optional[str] = None
     category: Optional[str] = None
     price: Optional[float] = None
     quantity: Optional[int] = None
 
 class SweetResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     name: str
     category: str
@@ -36,18 +48,21 @@ class SweetResponse(BaseModel):
     quantity: int
     created_at: str
 
-    class Config:
-        from_attributes = True
-
 # Purchase/Restock models
 class PurchaseRequest(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     quantity: int
 
 class RestockRequest(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     quantity: int
 
 # Search models
 class SearchParams(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     name: Optional[str] = None
     category: Optional[str] = None
     min_price: Optional[float] = None
@@ -1,83 +1,242 @@
 import streamlit as st
+import base64
+import orjson
+import pandas as pd
 import requests
+import threading
+import time
+import urllib3
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from streamlit_autorefresh import st_autorefresh
+from streamlit_cookies_manager import CookieManager
 from typing import Optional
+from urllib3.util.retry import Retry
 
 # API base URL
 API_BASE_URL = "http://localhost:8000"
+LOGIN_URL = f"{API_BASE_URL}/api/auth/login"
+REGISTER_URL = f"{API_BASE_URL}/api/auth/register"
+SWEETS_URL = f"{API_BASE_URL}/api/sweets"
+STATUS_URL = f"{API_BASE_URL}/docs"
+
+# Seconds between background checks of the API status
+STATUS_PROBE_INTERVAL = 10
+# Longest the page waits for the very first check, which has no earlier result to show
+STATUS_FIRST_PROBE_WAIT = 1.5
+
+# While inventory updates are in flight the browser reruns the page every
+# PENDING_OPS_REFRESH_MS, at most PENDING_OPS_REFRESH_LIMIT times
+PENDING_OPS_REFRESH_MS = 500
+PENDING_OPS_REFRESH_LIMIT = 30
+
+CONNECTION_ERROR = "Cannot connect to API. Make sure the server is running!"
+
+# Browser cookie that keeps the token across page reloads
+TOKEN_COOKIE = "sweet_shop_token"
+
+def create_http_session() -> requests.Session:
+    """Create an HTTP session that keeps connections to the API alive"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=2, backoff_factor=0.1)
+    )
+    session.mount("http://", adapter)
+    return session
+
+@st.cache_resource
+def get_io_pool() -> ThreadPoolExecutor:
+    """Worker threads, shared by all sessions, for running API calls in the background"""
+    return ThreadPoolExecutor(max_workers=4)
+
+@st.cache_resource
+def get_pool_manager() -> urllib3.PoolManager:
+    """Raw urllib3 pool, shared by all sessions, for the frequent sweets list fetch"""
+    return urllib3.PoolManager(
+        num_pools=2,
+        maxsize=16,
+        retries=Retry(total=2, backoff_factor=0.1),
+        timeout=5
+    )
 
 # Initialize session state
-if "token" not in st.session_state:
-    st.session_state.token = None
-if "username" not in st.session_state:
-    st.session_state.username = None
-if "is_admin" not in st.session_state:
-    st.session_state.is_admin = False
+for key, default in (
+    ("token", None),
+    ("username", None),
+    ("is_admin", False),
+    ("sweets_version", 0),
+    ("pending_ops", []),
+    ("sweets_editor_rev", 0),
+):
+    st.session_state.setdefault(key, default)
+# Only build the HTTP session when it is missing
+if "http_session" not in st.session_state:
+    st.session_state.http_session = create_http_session()
 
-def make_authenticated_request(method: str, endpoint: str, data: dict = None, params: dict = None):
-    """Make an authenticated API request"""
-    url = f"{API_BASE_URL}{endpoint}"
-    headers = {"Authorization": f"Bearer {st.session_state.token}"}
+# Reused across reruns so requests share pooled keep-alive connections
+SESSION = st.session_state.http_session
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _decode_claims(token: str) -> dict:
+    """Read a token's claims (cached across reruns)
     
+    The signature is not checked here: the token came straight from the API,
+    which verifies it on every request.
+    """
+    segment = token.split(".")[1]
+    return orjson.loads(base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4)))
+
+def _decode_token(token: str) -> Optional[dict]:
+    """Return the token's claims, or None if it is invalid or expired"""
     try:
-        if method == "GET":
-            response = requests.get(url, headers=headers, params=params)
-        elif method == "POST":
-            response = requests.post(url, headers=headers, json=data)
-        elif method == "PUT":
-            response = requests.put(url, headers=headers, json=data)
-        elif method == "DELETE":
-            response = requests.delete(url, headers=headers)
-        
-        if response.status_code == 200 or response.status_code == 201:
-            return response.json(), None
-        elif response.status_code == 204:
+        payload = _decode_claims(token)
+    except Exception:
+        return None
+    # Tokens can come from a cookie, so only trust an object with a numeric expiry
+    if not isinstance(payload, dict):
+        return None
+    exp = payload.get("exp")
+    if isinstance(exp, bool) or not isinstance(exp, (int, float)):
+        return None
+    # The cached claims outlive the token, so check expiry on every call
+    if exp <= time.time():
+        return None
+    return payload
+
+def _error_detail(headers, body: bytes, default: str) -> str:
+    """Return the API's "detail" message, or default when the body is not JSON"""
+    if headers.get("content-type", "").startswith("application/json"):
+        return orjson.loads(body).get("detail", default)
+    return default
+
+def _read_response(status_code: int, headers, body: bytes):
+    """Turn an API response into (data, error)"""
+    try:
+        if status_code == 200 or status_code == 201:
+            return orjson.loads(body), None
+        elif status_code == 204:
             return None, None
         else:
-            return None, response.json().get("detail", "An error occurred")
+            return None, _error_detail(headers, body, f"Request failed with status {status_code}")
+    except (orjson.JSONDecodeError, AttributeError) as e:
+        # Not the JSON the API sends, e.g. an HTML page from a proxy
+        return None, f"Unexpected response from API: {e}"
+
+def make_authenticated_request(method: str, endpoint: str, data: dict = None, params: dict = None):
+    """Make an authenticated API request (the Authorization header is set on SESSION at login)"""
+    try:
+        response = SESSION.request(method, API_BASE_URL + endpoint, json=data, params=params, timeout=5)
     except requests.exceptions.ConnectionError:
-        return None, "Cannot connect to API. Make sure the server is running!"
-    except Exception as e:
+        return None, CONNECTION_ERROR
+    except requests.exceptions.RequestException as e:
+        return None, str(e)
+    return _read_response(response.status_code, response.headers, response.content)
+
+def _pool_request(http: urllib3.PoolManager, method: str, url: str, token: str, data: dict = None):
+    """Send an authenticated request through the urllib3 pool and return (data, error)
+    
+    Unlike SESSION this is thread-safe, so worker threads use it too.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    body = None
+    if data is not None:
+        body = orjson.dumps(data)
+        headers["Content-Type"] = "application/json"
+    try:
+        response = http.request(method, url, body=body, headers=headers)
+    except urllib3.exceptions.HTTPError:
+        return None, CONNECTION_ERROR
+    return _read_response(response.status, response.headers, response.data)
+
+class ApiError(Exception):
+    """Raised from cached API helpers so that failures are not cached"""
+
+def _get_sweets(token: str) -> list:
+    """GET /api/sweets through urllib3 directly, skipping the requests layers"""
+    sweets, error = _pool_request(get_pool_manager(), "GET", SWEETS_URL, token)
+    if error:
+        raise ApiError(error)
+    return sweets
+
+@st.cache_data(ttl=30, show_spinner=False)
+def fetch_sweets(token: str, version: int) -> list:
+    """Fetch all sweets, cached per token and sweets_version"""
+    return _get_sweets(token)
+
+def load_sweets():
+    """Get all sweets for the current user as (sweets, error)"""
+    try:
+        return fetch_sweets(st.session_state.token, st.session_state.sweets_version), None
+    except ApiError as e:
         return None, str(e)
 
+def invalidate_sweets():
+    """Make the next load_sweets call refetch from the API"""
+    st.session_state.sweets_version += 1
+
+def submit_inventory_op(endpoint: str, data: dict, success_message: str):
+    """Send an inventory request on a worker thread instead of waiting for it"""
+    future = get_io_pool().submit(
+        _pool_request, get_pool_manager(), "POST", API_BASE_URL + endpoint, st.session_state.token, data
+    )
+    st.session_state.pending_ops.append((success_message, future))
+
+def collect_pending_ops():
+    """Report inventory requests that have finished and keep the rest pending"""
+    still_pending = []
+    for success_message, future in st.session_state.pending_ops:
+        if not future.done():
+            still_pending.append((success_message, future))
+            continue
+        _, error = future.result()
+        if error:
+            st.error(f"Error: {error}")
+        else:
+            st.success(success_message)
+            invalidate_sweets()
+    st.session_state.pending_ops = still_pending
+    if still_pending:
+        st.info(f"{len(still_pending)} inventory update(s) in progress...")
+        # The browser triggers the follow-up reruns, so this run never waits on the requests
+        st_autorefresh(interval=PENDING_OPS_REFRESH_MS, limit=PENDING_OPS_REFRESH_LIMIT, key="pending_ops_refresh")
+
+def _apply_token(token: str, username: str) -> bool:
+    """Store a freshly issued token in the session and return the admin flag"""
+    claims = _decode_token(token)
+    st.session_state.token = token
+    st.session_state.username = username
+    st.session_state.is_admin = claims.get("is_admin", False) if claims else False
+    # Sent with every later request made through this session
+    SESSION.headers["Authorization"] = f"Bearer {token}"
+    return st.session_state.is_admin
+
 def login(username: str, password: str):
     """Login user"""
     try:
-        # Clean and validate inputs
-        username = str(username).strip()
-        password = str(password).strip()
-        
+        # Inputs arrive already stripped by _clean
         if not username or not password:
             return False, "Username and password cannot be empty"
         
         payload = {"username": username, "password": password}
         
-        response = requests.post(
-            f"{API_BASE_URL}/api/auth/login",
+        response = SESSION.post(
+            LOGIN_URL,
             json=payload,
             timeout=5
         )
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             if "access_token" in data:
-                st.session_state.token = data["access_token"]
-                st.session_state.username = username
-                # Decode token to get admin status
-                import jwt
-                try:
-                    payload = jwt.decode(data["access_token"], "your-secret-key-change-in-production", algorithms=["HS256"])
-                    st.session_state.is_admin = payload.get("is_admin", False)
-                except Exception:
-                    st.session_state.is_admin = False
+                _apply_token(data["access_token"], username)
                 return True, "Login successful!"
             else:
                 return False, "Invalid response from server: missing access_token"
         else:
-            try:
-                error_data = response.json()
-                error_msg = error_data.get("detail", f"Login failed with status {response.status_code}")
-            except:
-                error_msg = f"Login failed with status {response.status_code}"
-            return False, error_msg
+            return False, _error_detail(
+                response.headers, response.content, f"Login failed with status {response.status_code}"
+            )
     except requests.exceptions.ConnectionError:
         return False, "Cannot connect to API. Make sure the server is running on http://localhost:8000"
     except KeyError as e:
@@ -88,11 +247,7 @@ def login(username: str, password: str):
 def register(username: str, password: str, admin_key: str = None):
     """Register new user"""
     try:
-        # Clean and validate inputs
-        username = str(username).strip()
-        password = str(password).strip()
-        admin_key = str(admin_key).strip() if admin_key else None
-        
+        # Inputs arrive already stripped by _clean
         if not username or not password:
             return False, "Username and password cannot be empty"
         
@@ -100,34 +255,23 @@ def register(username: str, password: str, admin_key: str = None):
         if admin_key:
             payload["admin_key"] = admin_key
         
-        response = requests.post(
-            f"{API_BASE_URL}/api/auth/register",
+        response = SESSION.post(
+            REGISTER_URL,
             json=payload,
             timeout=5
         )
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             if "access_token" in data:
-                st.session_state.token = data["access_token"]
-                st.session_state.username = username
-                # Decode token to get admin status
-                import jwt
-                try:
-                    payload = jwt.decode(data["access_token"], "your-secret-key-change-in-production", algorithms=["HS256"])
-                    st.session_state.is_admin = payload.get("is_admin", False)
-                except Exception:
-                    st.session_state.is_admin = False
-                admin_msg = " You are now logged in as admin!" if st.session_state.is_admin else " You are now logged in!"
+                is_admin = _apply_token(data["access_token"], username)
+                admin_msg = " You are now logged in as admin!" if is_admin else " You are now logged in!"
                 return True, "Registration successful!" + admin_msg
             else:
                 return False, "Invalid response from server: missing access_token"
         else:
-            try:
-                error_data = response.json()
-                error_msg = error_data.get("detail", f"Registration failed with status {response.status_code}")
-            except:
-                error_msg = f"Registration failed with status {response.status_code}"
-            return False, error_msg
+            return False, _error_detail(
+                response.headers, response.content, f"Registration failed with status {response.status_code}"
+            )
     except requests.exceptions.ConnectionError:
         return False, "Cannot connect to API. Make sure the server is running on http://localhost:8000"
     except KeyError as e:
@@ -135,22 +279,157 @@ def register(username: str, password: str, admin_key: str = None):
     except Exception as e:
         return False, f"Error: {str(e)}"
 
+@st.cache_resource
+def get_api_status() -> dict:
+    """Last known API status, shared by all sessions and updated by _probe_api"""
+    return {"connected": None, "checked_at": 0.0, "lock": threading.Lock()}
+
+def _probe_api(status: dict, http: urllib3.PoolManager):
+    """Check whether the API is reachable and record the result (runs on a background thread)"""
+    try:
+        # HEAD skips downloading the Swagger UI page
+        connected = http.request("HEAD", STATUS_URL, timeout=1, retries=False).status < 400
+    except Exception:
+        connected = False
+    status["connected"] = connected
+    status["checked_at"] = time.time()
+    status["lock"].release()
+
+def api_connected() -> Optional[bool]:
+    """Return the last known API status (None if the first check is still running)
+    
+    A stale status starts a new check in the background instead of waiting for it.
+    Only the first check is waited on, briefly, so the page opens with a real status.
+    """
+    status = get_api_status()
+    if time.time() - status["checked_at"] >= STATUS_PROBE_INTERVAL and status["lock"].acquire(blocking=False):
+        # The probe releases the lock, so at most one runs at a time
+        probe = threading.Thread(target=_probe_api, args=(status, get_pool_manager()), daemon=True)
+        probe.start()
+        if status["connected"] is None:
+            probe.join(STATUS_FIRST_PROBE_WAIT)
+    return status["connected"]
+
 def logout():
     """Logout user"""
     st.session_state.token = None
     st.session_state.username = None
     st.session_state.is_admin = False
+    SESSION.headers.pop("Authorization", None)
+    cookies.pop(TOKEN_COOKIE, None)
+    cookies.save()
+
+def _remember_token():
+    """Save the session's token in the browser so a reload skips the login form"""
+    cookies[TOKEN_COOKIE] = st.session_state.token
+    cookies.save()
+
+def _delete_removed_sweets(editor_key: str, ids: list):
+    """Delete the sweets whose rows an admin removed in the sweets table"""
+    edits = st.session_state[editor_key]
+    # A new editor key on the next run drops the edits, so rows that failed to delete reappear
+    st.session_state.sweets_editor_rev += 1
+    if edits["added_rows"]:
+        st.warning("Rows added in this table are not saved. Use the 'Add Sweet' tab instead.")
+    deleted = False
+    for row in edits["deleted_rows"]:
+        _, error = make_authenticated_request("DELETE", f"/api/sweets/{ids[row]}")
+        if error:
+            st.error(f"Error: {error}")
+        else:
+            deleted = True
+    if deleted:
+        st.success("Sweet deleted!")
+        invalidate_sweets()
+
+def _clean(s: str) -> str:
+    """Strip a text input value, treating None as empty"""
+    return (s or "").strip()
+
+def _handle_login_submit(username: str, password: str):
+    """Validate the login form and log in"""
+    username = _clean(username)
+    password = _clean(password)
+    
+    if username and password:
+        success, message = login(username, password)
+        if success:
+            _remember_token()
+            st.success(message)
+            st.rerun()
+        else:
+            st.error(message)
+    else:
+        st.error("Please enter both username and password")
+
+def _handle_register_submit(username: str, password: str, admin_key: str):
+    """Validate the register form and register"""
+    username = _clean(username)
+    password = _clean(password)
+    admin_key = _clean(admin_key) or None
+    
+    if username and password:
+        success, message = register(username, password, admin_key)
+        if success:
+            _remember_token()
+            st.success(message)
+            st.rerun()
+        else:
+            st.error(message)
+    else:
+        st.error("Please enter both username and password")
+
+def _handle_add_sweet(name: str, category: str, price: float, quantity: int):
+    """Validate the add sweet form and create the sweet"""
+    if name and category and price >= 0 and quantity >= 0:
+        data = {"name": name, "category": category, "price": price, "quantity": quantity}
+        result, error = make_authenticated_request("POST", "/api/sweets", data=data)
+        if error:
+            st.error(f"Error: {error}")
+        else:
+            st.success(f"Sweet '{name}' added successfully!")
+            invalidate_sweets()
+            st.rerun()
+    else:
+        st.error("Please fill all required fields with valid values")
+
+def _handle_purchase(sweet_id: int, quantity: int):
+    """Queue a purchase of the selected sweet"""
+    submit_inventory_op(f"/api/sweets/{sweet_id}/purchase", {"quantity": quantity}, f"Purchased {quantity} unit(s)!")
+    st.rerun()
+
+def _handle_restock(sweet_id: int, quantity: int):
+    """Queue a restock of the selected sweet"""
+    submit_inventory_op(f"/api/sweets/{sweet_id}/restock", {"quantity": quantity}, f"Restocked {quantity} unit(s)!")
+    st.rerun()
 
 # Main app
 st.set_page_config(page_title="Sweet Shop Management", layout="wide")
 
+# The cookie component reports the browser's cookies on the next run
+cookies = CookieManager()
+if not cookies.ready():
+    st.stop()
+
+# Restore the login from an earlier visit while its token is still valid
+if not st.session_state.token and TOKEN_COOKIE in cookies:
+    saved_token = cookies[TOKEN_COOKIE]
+    claims = _decode_token(saved_token)
+    if claims:
+        _apply_token(saved_token, claims.get("sub"))
+    else:
+        del cookies[TOKEN_COOKIE]
+        cookies.save()
+
 st.title("🍬 Sweet Shop Management System")
 
 # Check API connection
-try:
-    response = requests.get(f"{API_BASE_URL}/docs", timeout=2)
+connected = api_connected()
+if connected is None:
+    api_status = "⚪ Checking API connection..."
+elif connected:
     api_status = "🟢 API Connected"
-except:
+else:
     api_status = "🔴 API Not Connected - Make sure to run 'python main.py' first!"
 
 st.sidebar.markdown(f"**Status:** {api_status}")
@@ -168,20 +447,9 @@ if not st.session_state.token:
             login_username = st.text_input("Username", key="login_username")
             login_password = st.text_input("Password", type="password", key="login_password")
             login_submit = st.form_submit_button("Login")
-            
-            if login_submit:
-                login_username = login_username.strip() if login_username else ""
-                login_password = login_password.strip() if login_password else ""
-                
-                if login_username and login_password:
-                    success, message = login(login_username, login_password)
-                    if success:
-                        st.success(message)
-                        st.rerun()
-                    else:
-                        st.error(message)
-                else:
-                    st.error("Please enter both username and password")
+        
+        if login_submit:
+            _handle_login_submit(login_username, login_password)
     
     with tab2:
         with st.form("register_form"):
@@ -189,21 +457,9 @@ if not st.session_state.token:
             reg_password = st.text_input("Password", type="password", key="reg_password")
             reg_admin_key = st.text_input("Admin Key (optional)", type="password", key="reg_admin_key", help="Enter 'aswd' to get admin privileges")
             reg_submit = st.form_submit_button("Register")
-            
-            if reg_submit:
-                reg_username = reg_username.strip() if reg_username else ""
-                reg_password = reg_password.strip() if reg_password else ""
-                reg_admin_key = reg_admin_key.strip() if reg_admin_key else None
-                
-                if reg_username and reg_password:
-                    success, message = register(reg_username, reg_password, reg_admin_key)
-                    if success:
-                        st.success(message)
-                        st.rerun()
-                    else:
-                        st.error(message)
-                else:
-                    st.error("Please enter both username and password")
+        
+        if reg_submit:
+            _handle_register_submit(reg_username, reg_password, reg_admin_key)
 
 else:
     # User is logged in
@@ -217,6 +473,12 @@ else:
             logout()
             st.rerun()
     
+    # Results of purchases/restocks sent on earlier reruns
+    collect_pending_ops()
+    
+    # Fetch the sweets once per rerun; the View and Inventory tabs share it
+    sweets, sweets_error = load_sweets()
+    
     # Main functionality tabs
     tab1, tab2, tab3, tab4 = st.tabs(["View Sweets", "Add Sweet", "Search", "Inventory"])
     
@@ -224,34 +486,43 @@ else:
     with tab1:
         st.header("All Sweets")
         if st.button("Refresh List"):
+            invalidate_sweets()
             st.rerun()
         
-        sweets, error = make_authenticated_request("GET", "/api/sweets")
-        if error:
-            st.error(f"Error: {error}")
+        if sweets_error:
+            st.error(f"Error: {sweets_error}")
         elif sweets:
             if len(sweets) == 0:
                 st.info("No sweets available. Add some sweets using the 'Add Sweet' tab!")
             else:
-                for sweet in sweets:
-                    with st.expander(f"🍬 {sweet['name']} - ${sweet['price']:.2f}"):
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.write(f"**Category:** {sweet['category']}")
-                            st.write(f"**Price:** ${sweet['price']:.2f}")
-                            st.write(f"**Quantity in Stock:** {sweet['quantity']}")
-                        with col2:
-                            st.write(f"**ID:** {sweet['id']}")
-                            st.write(f"**Created:** {sweet['created_at'][:10]}")
-                            
-                            if st.session_state.is_admin:
-                                if st.button(f"Delete", key=f"delete_{sweet['id']}"):
-                                    _, error = make_authenticated_request("DELETE", f"/api/sweets/{sweet['id']}")
-                                    if error:
-                                        st.error(f"Error: {error}")
-                                    else:
-                                        st.success("Sweet deleted!")
-                                        st.rerun()
+                # One table instead of an expander per sweet
+                df = pd.DataFrame(sweets)
+                df["created_at"] = df["created_at"].str[:10]
+                column_config = {
+                    "id": "ID",
+                    "name": "Name",
+                    "category": "Category",
+                    "price": st.column_config.NumberColumn("Price", format="$%.2f"),
+                    "quantity": "Quantity in Stock",
+                    "created_at": "Created",
+                }
+                if st.session_state.is_admin:
+                    # Admins delete sweets by removing rows; the key changes with the list and after every edit
+                    editor_key = f"sweets_editor_{st.session_state.sweets_version}_{st.session_state.sweets_editor_rev}"
+                    st.caption("Select rows and press Delete to remove sweets. New sweets go through the 'Add Sweet' tab.")
+                    st.data_editor(
+                        df,
+                        key=editor_key,
+                        column_config=column_config,
+                        disabled=list(df.columns),
+                        num_rows="dynamic",
+                        hide_index=True,
+                        use_container_width=True,
+                        on_change=_delete_removed_sweets,
+                        args=(editor_key, df["id"].tolist())
+                    )
+                else:
+                    st.dataframe(df, column_config=column_config, hide_index=True, use_container_width=True)
     
     # Tab 2: Add Sweet
     with tab2:
@@ -262,18 +533,9 @@ else:
             price = st.number_input("Price *", min_value=0.0, step=0.01, format="%.2f")
             quantity = st.number_input("Initial Quantity *", min_value=0, step=1)
             submit = st.form_submit_button("Add Sweet")
-            
-            if submit:
-                if name and category and price >= 0 and quantity >= 0:
-                    data = {"name": name, "category": category, "price": price, "quantity": quantity}
-                    result, error = make_authenticated_request("POST", "/api/sweets", data=data)
-                    if error:
-                        st.error(f"Error: {error}")
-                    else:
-                        st.success(f"Sweet '{name}' added successfully!")
-                        st.rerun()
-                else:
-                    st.error("Please fill all required fields with valid values")
+        
+        if submit:
+            _handle_add_sweet(name, category, price, quantity)
     
     # Tab 3: Search Sweets
     with tab3:
@@ -314,17 +576,15 @@ else:
     with tab4:
         st.header("Inventory Management")
         
-        # Get all sweets for selection
-        sweets, error = make_authenticated_request("GET", "/api/sweets")
-        if error:
-            st.error(f"Error: {error}")
+        if sweets_error:
+            st.error(f"Error: {sweets_error}")
         elif sweets:
             if len(sweets) == 0:
                 st.info("No sweets available. Add some sweets first!")
             else:
-                sweet_options = {f"{s['name']} (ID: {s['id']}, Stock: {s['quantity']})": s['id'] for s in sweets}
-                selected_sweet = st.selectbox("Select a Sweet", list(sweet_options.keys()))
-                sweet_id = sweet_options[selected_sweet]
+                # The options are IDs, so the selection needs no reverse lookup
+                labels = {sweet["id"]: f"{sweet['name']} (ID: {sweet['id']}, Stock: {sweet['quantity']})" for sweet in sweets}
+                sweet_id = st.selectbox("Select a Sweet", list(labels), format_func=labels.get)
                 
                 col1, col2 = st.columns(2)
                 
@@ -334,15 +594,9 @@ else:
                     with st.form("purchase_form"):
                         purchase_qty = st.number_input("Quantity to Purchase", min_value=1, step=1, key="purchase_qty")
                         purchase_submit = st.form_submit_button("Purchase")
-                        
-                        if purchase_submit:
-                            data = {"quantity": purchase_qty}
-                            result, error = make_authenticated_request("POST", f"/api/sweets/{sweet_id}/purchase", data=data)
-                            if error:
-                                st.error(f"Error: {error}")
-                            else:
-                                st.success(f"Purchased {purchase_qty} unit(s)!")
-                                st.rerun()
+                    
+                    if purchase_submit:
+                        _handle_purchase(sweet_id, purchase_qty)
                 
                 # Restock section (Admin only)
                 with col2:
@@ -351,17 +605,10 @@ else:
                         with st.form("restock_form"):
                             restock_qty = st.number_input("Quantity to Restock", min_value=1, step=1, key="restock_qty")
                             restock_submit = st.form_submit_button("Restock")
-                            
-                            if restock_submit:
-                                data = {"quantity": restock_qty}
-                                result, error = make_authenticated_request("POST", f"/api/sweets/{sweet_id}/restock", data=data)
-                                if error:
-                                    st.error(f"Error: {error}")
-                                else:
-                                    st.success(f"Restocked {restock_qty} unit(s)!")
-                                    st.rerun()
+                        
+                        if restock_submit:
+                            _handle_restock(sweet_id, restock_qty)
                     else:
                         st.info("🔒 Admin access required for restocking")
         else:
             st.info("No sweets available. Add some sweets first!")
-